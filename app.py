@@ -1,21 +1,36 @@
 import os
 import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import date
+from typing import Dict, List, Tuple
 import streamlit as st
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from src import main_processor
+from src.chunk_file import ChunkFile
 from src.vector_store import VectorStoreManager
 from src.rag_engine import RAGEngine
 
+logger = logging.getLogger(__name__)
+
 # --- 初期化 ---
 @st.cache_resource
 def get_openai_client() -> OpenAI:
+    return OpenAI(**_openai_client_options())
+
+@st.cache_resource
+def get_async_openai_client() -> AsyncOpenAI:
+    # 同期クライアントと同じ設定で作成する
+    return AsyncOpenAI(**_openai_client_options())
+
+def _openai_client_options() -> Dict[str, str]:
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
         st.error("環境変数にOPENAI_API_KEYが設定されていません。")
         st.stop()
-    return OpenAI(api_key=api_key)
+    return {"api_key": api_key}
 
 @st.cache_resource
 def get_vector_store(_client: OpenAI) -> VectorStoreManager:
@@ -26,6 +41,68 @@ def get_rag_engine(_vector_store: VectorStoreManager, _client: OpenAI) -> RAGEng
     return RAGEngine(_vector_store, _client)
 
 TEMP_DIR = Path("uploaded_temp")
+INGEST_WORKERS = 4  # process_file is bound by OpenAI calls, so files run in parallel
+
+@st.cache_resource
+def get_ingest_executor() -> ThreadPoolExecutor:
+    # Background workers for file processing so the UI is not blocked
+    return ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+@st.cache_resource
+def get_store_lock() -> threading.Lock:
+    # 取り込みワーカーと画面操作からのベクトルストア更新を直列化する
+    return threading.Lock()
+
+def _ingest_file(vector_store: VectorStoreManager, store_lock: threading.Lock, temp_path: Path,
+                 metadata: Dict, client: OpenAI, job_dir: Path, aclient: AsyncOpenAI) -> int:
+    """Process an uploaded file and add it to the vector store; return the chunk count.
+
+    Runs on an ingest worker so the document is stored and the temporary files are
+    removed even if the session that submitted it has gone away.
+    """
+    try:
+        chunks, thumb_path = main_processor.process_file(str(temp_path), metadata, client, job_dir, aclient)
+        if chunks:
+            with store_lock:
+                vector_store.add_document(temp_path, chunks, thumb_path)
+        return len(chunks)
+    except Exception as e:
+        logger.error("Failed to ingest %s: %s", temp_path.name, e, exc_info=True)
+        raise
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+@st.cache_data(show_spinner=False)
+def _thumb_index(docs_path: Path, doc_ids: Tuple[str, ...]) -> Dict[str, str]:
+    """Map each doc_id to its thumbnail path. Keyed on doc_ids so adds/deletes refresh it."""
+    index = {}
+    for doc_id in doc_ids:
+        # New thumbnails are WebP; documents registered earlier have PNG ones
+        thumb_files = sorted((docs_path / doc_id).glob("thumbnail_*.*"))
+        if thumb_files:
+            index[doc_id] = str(thumb_files[0])
+    return index
+
+@st.cache_data(show_spinner=False, max_entries=1000)
+def _chunk_rows(chunks_path: str, mtime: float) -> Tuple[str, List[Dict[str, str]]]:
+    """Source file name and detail rows of a document; mtime is part of the cache key."""
+    chunks = list(ChunkFile(Path(chunks_path)))
+    if not chunks:
+        return "", []
+    # メタデータを日本語の列名で一つの表にまとめて表示
+    rows = [
+        {
+            "チャンク": chunk['text'],
+            "ページ番号": str(chunk['metadata'].get('page', 'N/A')),
+            "種類": chunk['metadata'].get('type', 'N/A'),
+            "作成者": chunk['metadata'].get('author', '未設定'),
+            "有効期限": chunk['metadata'].get('expiration_date', '未設定'),
+            "AI要約": chunk['metadata'].get('ai_summary', 'なし'),
+            "AIタグ": ", ".join(map(str, chunk['metadata'].get('ai_tags', []))),
+        }
+        for chunk in chunks
+    ]
+    return chunks[0]["metadata"].get("source_file", "不明なファイル"), rows
 
 # --- UI関数 ---
 def display_knowledge_base(vector_store: VectorStoreManager):
@@ -38,20 +115,26 @@ def display_knowledge_base(vector_store: VectorStoreManager):
         st.info("現在、登録されているナレッジはありません。")
         return
 
-    for doc_id, chunks in vector_store.documents.items():
-        if not chunks:
+    thumbs = _thumb_index(vector_store.docs_path, tuple(vector_store.documents))
+    for doc_id in vector_store.documents:
+        chunks_path = vector_store.docs_path / doc_id / "chunks.jsonl"
+        try:
+            mtime = chunks_path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        # Parsed once per file version instead of on every rerun
+        source_file, rows = _chunk_rows(str(chunks_path), mtime)
+        if not rows:
             continue
-        
-        source_file = chunks[0]["metadata"].get("source_file", "不明なファイル")
+
         with st.container(border=True):
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.subheader(source_file)
                 # Display thumbnail if available
-                doc_dir = vector_store.docs_path / doc_id
-                thumb_files = list(doc_dir.glob("thumbnail_*.png"))
-                if thumb_files:
-                    with open(thumb_files[0], "rb") as f:
+                thumb_file = thumbs.get(doc_id)
+                if thumb_file:
+                    with open(thumb_file, "rb") as f:
                         st.image(f.read(), width=100)
             with col2:
                 if st.button("削除", key=f"delete_{doc_id}", type="primary"):
@@ -59,20 +142,7 @@ def display_knowledge_base(vector_store: VectorStoreManager):
                     st.rerun()
 
             with st.expander("詳細を表示"):
-                # st.json(chunks) # Display all chunks and metadata
-                for chunk in chunks:
-                    st.write(f"**チャンク:** {chunk['text']}")
-                    # メタデータを日本語で表示
-                    meta_display = {
-                        "ソースファイル": chunk['metadata'].get('source_file', '不明'),
-                        "ページ番号": chunk['metadata'].get('page', 'N/A'),
-                        "種類": chunk['metadata'].get('type', 'N/A'),
-                        "作成者": chunk['metadata'].get('author', '未設定'),
-                        "有効期限": chunk['metadata'].get('expiration_date', '未設定'),
-                        "AI要約": chunk['metadata'].get('ai_summary', 'なし'),
-                        "AIタグ": chunk['metadata'].get('ai_tags', [])
-                    }
-                    st.json(meta_display)
+                st.dataframe(rows, use_container_width=True, hide_index=True)
 
     # --- 削除確認モーダル ---
     if st.session_state.pending_delete:
@@ -85,7 +155,8 @@ def display_knowledge_base(vector_store: VectorStoreManager):
             if required and pw != required:
                 st.error("パスワードが一致しません")
             else:
-                vector_store.delete_document(doc_id)
+                with get_store_lock():
+                    vector_store.delete_document(doc_id)
                 st.session_state.pending_delete = None
                 st.success("削除が完了しました")
                 st.rerun()
@@ -93,12 +164,131 @@ def display_knowledge_base(vector_store: VectorStoreManager):
             st.session_state.pending_delete = None
             st.rerun()
 
+@st.fragment(run_every=2)
+def display_ingest_status():
+    """Show progress of background ingest jobs and report the finished ones."""
+    jobs = st.session_state.ingest_jobs
+    finished = [job_id for job_id, job in jobs.items() if job["future"].done()]
+    for job_id in finished:
+        job = jobs.pop(job_id)
+        try:
+            if job["future"].result():
+                st.toast(f"{job['name']} を登録しました")
+            else:
+                st.toast(f"{job['name']} から登録できる内容がありませんでした")
+        except Exception:
+            # Already logged by the worker
+            st.toast(f"{job['name']} の登録に失敗しました")
+
+    if not jobs:
+        st.session_state.ingest_total = 0
+    if finished:
+        # Refresh the whole page so the knowledge list shows the new documents
+        st.rerun()
+
+    total = max(st.session_state.ingest_total, len(jobs))
+    done = total - len(jobs)
+    st.progress(done / total, text=f"登録処理中: {done}/{total} 件完了")
+    for job in jobs.values():
+        st.caption(f"処理中: {job['name']}")
+
+@st.fragment
+def chat_panel(rag_engine: RAGEngine, vector_store: VectorStoreManager):
+    """Chat UI; runs as a fragment so typing does not rerun the sidebar."""
+    st.header("チャット")
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+    if "filter_author" not in st.session_state:
+        st.session_state.filter_author = ""
+    if "filter_tags" not in st.session_state:
+        st.session_state.filter_tags = []
+    if "filter_keyword" not in st.session_state:
+        st.session_state.filter_keyword = ""
+    if "use_date_filter" not in st.session_state:
+        st.session_state.use_date_filter = False
+    if "filter_start_date" not in st.session_state:
+        st.session_state.filter_start_date = date.today()
+    if "filter_end_date" not in st.session_state:
+        st.session_state.filter_end_date = date.today()
+
+    with st.expander("検索オプション"):
+        st.text_input("作成者で絞り込み", key="filter_author")
+        tag_str = st.text_input("タグで絞り込み(カンマ区切り)", key="filter_tag")
+        st.session_state.filter_tags = [t.strip() for t in tag_str.split(",") if t.strip()]
+        st.text_input("キーワード", key="filter_keyword")
+        st.checkbox("有効期限で範囲指定", key="use_date_filter")
+        if st.session_state.use_date_filter:
+            col_s, col_e = st.columns(2)
+            col_s.date_input("開始日", key="filter_start_date")
+            col_e.date_input("終了日", key="filter_end_date")
+
+    for msg in st.session_state.messages:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+    if user_input := st.chat_input("質問を入力してください"):
+        st.session_state.messages.append({"role": "user", "content": user_input})
+        with st.chat_message("user"):
+            st.markdown(user_input)
+
+        with st.spinner("考え中..."):
+            filters = {}
+
+            # **修正**: フィルタの適用を明確化
+            if st.session_state.filter_author:
+                filters["author"] = st.session_state.filter_author
+            if st.session_state.filter_tags:
+                filters["tag"] = st.session_state.filter_tags
+            if st.session_state.filter_keyword:
+                filters["keyword"] = st.session_state.filter_keyword
+
+            # **重要**: ユーザーが明示的に日付範囲を指定した場合のみ適用
+            # そうでなければ全期間のナレッジが検索対象になる
+            if st.session_state.use_date_filter:
+                start = st.session_state.filter_start_date.strftime("%Y-%m-%d")
+                end = st.session_state.filter_end_date.strftime("%Y-%m-%d")
+                filters["expiration_date_start"] = start
+                filters["expiration_date_end"] = end
+                logger.debug("ユーザー指定の日付範囲: %s から %s", start, end)
+            else:
+                logger.debug("日付フィルタ未指定 - 全期間から検索します")
+
+            # **デバッグ情報の表示**
+            if filters:
+                st.info(f"適用フィルタ: {filters}")
+
+            result = rag_engine.answer_question(user_input, filters)
+            answer = result.get("answer", "申し訳ありません、回答を生成できませんでした。")
+            sources = result.get("sources", [])
+            
+            response_content = answer
+            if sources:
+                response_content += "\n\n**参照ソース:**\n"
+                thumbs = _thumb_index(vector_store.docs_path, tuple(vector_store.documents))
+                for source in sources:
+                    metadata = source.get("metadata", {})
+                    source_file = metadata.get("source_file", "不明")
+                    doc_id = source.get("doc_id")
+                    
+                    # Display thumbnail if available
+                    thumb_file = thumbs.get(doc_id) if doc_id else None
+                    if thumb_file:
+                        st.image(thumb_file, width=100)
+                    
+                    response_content += f"- {source_file} (Page: {metadata.get('page', 'N/A')})\n"
+
+        with st.chat_message("assistant"):
+            st.markdown(response_content)
+
+        st.session_state.messages.append({"role": "assistant", "content": response_content})
+
 # --- メイン処理 ---
 def main() -> None:
     st.set_page_config(layout="wide", page_title="統合ナレッジ検索システム")
     st.title("統合ナレッジ検索システム")
 
     client = get_openai_client()
+    aclient = get_async_openai_client()
     vector_store = get_vector_store(client)
     rag_engine = get_rag_engine(vector_store, client)
 
@@ -116,11 +306,15 @@ def main() -> None:
 
         if uploaded_files:
             for file in uploaded_files:
-                file_id = file.file_id
-                if file_id not in st.session_state.metadata_map:
-                    st.session_state.metadata_map[file_id] = {
+                if file.file_id not in st.session_state.metadata_map:
+                    st.session_state.metadata_map[file.file_id] = {
                         "author": "", "expiration_date": date.today(), "custom_metadata": []
                     }
+
+        # Per-file editors are only rendered on demand to keep reruns cheap
+        if uploaded_files and st.checkbox("メタデータを編集", value=False):
+            for file in uploaded_files:
+                file_id = file.file_id
                 with st.expander(f"ファイル: {file.name}"):
                     st.session_state.metadata_map[file_id]['author'] = st.text_input(
                         "作成者",
@@ -153,34 +347,46 @@ def main() -> None:
                             st.session_state[f"new_val_{file_id}"] = ""
                             st.rerun()
 
+        if 'ingest_jobs' not in st.session_state:
+            st.session_state.ingest_jobs = {}
+            st.session_state.ingest_total = 0
+
         if st.button("選択したファイルをナレッジに登録"):
             if uploaded_files:
-                TEMP_DIR.mkdir(exist_ok=True)
-                with st.spinner("登録処理中..."):
-                    for file in uploaded_files:
-                        # Save to a temporary location
-                        temp_path = TEMP_DIR / file.name
-                        with open(temp_path, "wb") as f:
-                            f.write(file.getbuffer())
-
-                        # Process and add to vector store
-                        session_meta = st.session_state.metadata_map.get(file.file_id, {})
-                        meta_for_processing = {
-                            "author": session_meta.get("author", ""),
-                            "expiration_date": session_meta.get("expiration_date"),
-                        }
-                        if isinstance(meta_for_processing.get('expiration_date'), date):
-                            meta_for_processing['expiration_date'] = meta_for_processing['expiration_date'].strftime("%Y-%m-%d")
-                        for item in session_meta.get('custom_metadata', []):
-                            meta_for_processing[item.get('key')] = item.get('value')
-                        
-                        chunks, thumb_path = main_processor.process_file(str(temp_path), meta_for_processing, client, TEMP_DIR)
-                        if chunks:
-                            vector_store.add_document(temp_path, chunks, thumb_path)
-
-                shutil.rmtree(TEMP_DIR) # Clean up temp directory
+                executor = get_ingest_executor()
+                store_lock = get_store_lock()
+                for file in uploaded_files:
+                    if file.file_id in st.session_state.ingest_jobs:
+                        continue
+                    # Save to a per-job temporary location
+                    job_dir = TEMP_DIR / file.file_id
+                    job_dir.mkdir(parents=True, exist_ok=True)
+                    temp_path = job_dir / file.name
+                    file.seek(0)
+                    with open(temp_path, "wb") as f:
+                        shutil.copyfileobj(file, f, length=1024 * 1024)
+
+                    # Process in the background; the worker adds the chunks to the vector store
+                    session_meta = st.session_state.metadata_map.get(file.file_id, {})
+                    meta_for_processing = {
+                        "author": session_meta.get("author", ""),
+                        "expiration_date": session_meta.get("expiration_date"),
+                    }
+                    if isinstance(meta_for_processing.get('expiration_date'), date):
+                        meta_for_processing['expiration_date'] = meta_for_processing['expiration_date'].strftime("%Y-%m-%d")
+                    for item in session_meta.get('custom_metadata', []):
+                        meta_for_processing[item.get('key')] = item.get('value')
+
+                    future = executor.submit(
+                        _ingest_file, vector_store, store_lock, temp_path, meta_for_processing, client, job_dir, aclient
+                    )
+                    st.session_state.ingest_jobs[file.file_id] = {
+                        "name": file.name, "path": temp_path, "future": future
+                    }
+                    st.session_state.ingest_total += 1
+
                 st.session_state.metadata_map.clear()
-                st.success("ナレッジの登録が完了しました！")
+                st.success("ナレッジの登録を開始しました。進捗はナレッジ管理タブで確認できます。")
                 st.rerun()
             else:
                 st.warning("ファイルをアップロードしてください。")
@@ -189,96 +395,11 @@ def main() -> None:
     tab1, tab2 = st.tabs(["チャット", "ナレッジ管理"]) 
 
     with tab1:
-        st.header("チャット")
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-        if "filter_author" not in st.session_state:
-            st.session_state.filter_author = ""
-        if "filter_tags" not in st.session_state:
-            st.session_state.filter_tags = []
-        if "filter_keyword" not in st.session_state:
-            st.session_state.filter_keyword = ""
-        if "use_date_filter" not in st.session_state:
-            st.session_state.use_date_filter = False
-        if "filter_start_date" not in st.session_state:
-            st.session_state.filter_start_date = date.today()
-        if "filter_end_date" not in st.session_state:
-            st.session_state.filter_end_date = date.today()
-
-        with st.expander("検索オプション"):
-            st.text_input("作成者で絞り込み", key="filter_author")
-            tag_str = st.text_input("タグで絞り込み(カンマ区切り)", key="filter_tag")
-            st.session_state.filter_tags = [t.strip() for t in tag_str.split(",") if t.strip()]
-            st.text_input("キーワード", key="filter_keyword")
-            st.checkbox("有効期限で範囲指定", key="use_date_filter")
-            if st.session_state.use_date_filter:
-                col_s, col_e = st.columns(2)
-                col_s.date_input("開始日", key="filter_start_date")
-                col_e.date_input("終了日", key="filter_end_date")
-
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
-
-        if user_input := st.chat_input("質問を入力してください"):
-            st.session_state.messages.append({"role": "user", "content": user_input})
-            with st.chat_message("user"):
-                st.markdown(user_input)
-
-            with st.spinner("考え中..."):
-                filters = {}
-
-                # **修正**: フィルタの適用を明確化
-                if st.session_state.filter_author:
-                    filters["author"] = st.session_state.filter_author
-                if st.session_state.filter_tags:
-                    filters["tag"] = st.session_state.filter_tags
-                if st.session_state.filter_keyword:
-                    filters["keyword"] = st.session_state.filter_keyword
-
-                # **重要**: ユーザーが明示的に日付範囲を指定した場合のみ適用
-                # そうでなければRAGエンジンで自動的に期限切れフィルタが適用される
-                if st.session_state.use_date_filter:
-                    start = st.session_state.filter_start_date.strftime("%Y-%m-%d")
-                    end = st.session_state.filter_end_date.strftime("%Y-%m-%d")
-                    filters["expiration_date_start"] = start
-                    filters["expiration_date_end"] = end
-                    # 明示的な日付範囲が指定された場合は、自動の期限切れフィルタを無効化
-                    print(f"[DEBUG] ユーザー指定の日付範囲: {start} から {end}")
-                else:
-                    print("[DEBUG] 日付フィルタ未指定 - RAGエンジンで自動期限切れフィルタが適用されます")
-
-                # **デバッグ情報の表示**
-                if filters:
-                    st.info(f"適用フィルタ: {filters}")
-
-                result = rag_engine.answer_question(user_input, filters)
-                answer = result.get("answer", "申し訳ありません、回答を生成できませんでした。")
-                sources = result.get("sources", [])
-                
-                response_content = answer
-                if sources:
-                    response_content += "\n\n**参照ソース:**\n"
-                    for source in sources:
-                        metadata = source.get("metadata", {})
-                        source_file = metadata.get("source_file", "不明")
-                        doc_id = source.get("doc_id")
-                        
-                        # Display thumbnail if available
-                        if doc_id:
-                            doc_dir = vector_store.docs_path / doc_id
-                            thumb_files = list(doc_dir.glob("thumbnail_*.png"))
-                            if thumb_files:
-                                st.image(str(thumb_files[0]), width=100)
-                        
-                        response_content += f"- {source_file} (Page: {metadata.get('page', 'N/A')})\n"
-
-            with st.chat_message("assistant"):
-                st.markdown(response_content)
-
-            st.session_state.messages.append({"role": "assistant", "content": response_content})
+        chat_panel(rag_engine, vector_store)
 
     with tab2:
+        if st.session_state.ingest_jobs:
+            display_ingest_status()
         display_knowledge_base(vector_store)
 
 if __name__ == "__main__":
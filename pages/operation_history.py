@@ -1,15 +1,38 @@
-import json
 from pathlib import Path
+import orjson
 import streamlit as st
 
 from src.utils import LOG_FILE
 
+TAIL_LINES = 500
+TAIL_BYTES = 256 * 1024
+
+@st.cache_data(ttl=5)
+def _load_tail(path: str, mtime: float, size: int, n: int = TAIL_LINES) -> list:
+    """Read only the last ``n`` records; mtime/size are part of the cache key."""
+    offset = max(0, size - TAIL_BYTES)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        lines = f.read().splitlines()
+    if offset:
+        lines = lines[1:]  # first line is likely cut in the middle
+    logs = []
+    for line in lines[-n:]:
+        if line:
+            try:
+                logs.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                continue
+    return logs
+
 st.set_page_config(page_title="操作履歴", layout="wide")
 st.title("操作履歴")
 
 if LOG_FILE.exists():
-    logs = [json.loads(line) for line in LOG_FILE.read_text(encoding="utf-8").splitlines()]
+    stat = LOG_FILE.stat()
+    logs = _load_tail(str(LOG_FILE), stat.st_mtime, stat.st_size)
     if logs:
+        st.caption(f"最新{TAIL_LINES}件まで表示しています。")
         st.table(logs)
     else:
         st.info("ログがまだありません。")
@@ -0,0 +1,85 @@
+"""Persistent cache for AI generated results keyed by content hash."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = Path("data/ai_cache.sqlite3")
+
+_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(CACHE_FILE, timeout=30)
+    if not _initialized:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache (key TEXT PRIMARY KEY, value JSON, ts INTEGER)"
+        )
+        conn.commit()
+        _initialized = True
+    return conn
+
+
+def content_key(namespace: str, data: Union[str, bytes]) -> str:
+    """Build a cache key from a namespace and the hashed content."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return f"{namespace}:{hashlib.blake2b(data).hexdigest()}"
+
+
+def get(key: str) -> Optional[Any]:
+    """Return the cached value for ``key`` or None if missing."""
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                row = conn.execute("SELECT value FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            finally:
+                conn.close()
+    except sqlite3.Error as exc:
+        logger.warning("AI cache read failed: %s", exc)
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def put(key: str, value: Any) -> None:
+    """Store ``value`` under ``key``."""
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ai_cache (key, value, ts) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), int(time.time())),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+    except sqlite3.Error as exc:
+        logger.warning("AI cache write failed: %s", exc)
+
+
+def get_or_compute(key: str, fn: Callable[[], Any]) -> Any:
+    """Return the cached value for ``key``, computing and storing it on a miss.
+
+    Empty results (failed API calls) are not cached so they are retried later.
+    """
+    cached = get(key)
+    if cached is not None:
+        return cached
+    value = fn()
+    if value:
+        put(key, value)
+    return value
@@ -0,0 +1,74 @@
+"""Read-only, lazily parsed view of a chunks.jsonl file."""
+
+from __future__ import annotations
+
+import mmap
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Union, overload
+
+import numpy as np
+import orjson
+
+
+class ChunkFile(Sequence):
+    """Sequence of chunk dicts read and parsed on access from a JSONL file.
+
+    Only the line offsets are kept in memory, so opening a knowledge base
+    costs one newline scan per file instead of parsing every chunk. No file
+    handle stays open between accesses, so large knowledge bases do not run
+    into the open file limit.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._starts = self._ends = np.empty(0, dtype="int64")
+        with open(self.path, "rb") as f:
+            size = f.seek(0, 2)
+            # mmap cannot map an empty file
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    self._index_lines(mm, size)
+
+    def _index_lines(self, mm: mmap.mmap, size: int) -> None:
+        data = np.frombuffer(mm, dtype=np.uint8)
+        newlines = np.flatnonzero(data == 0x0A)
+        del data  # release the buffer export so the mmap can be closed
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [size]))
+        # Drop blank lines, including the empty tail after the final newline
+        keep = ends > starts
+        self._starts = starts[keep]
+        self._ends = ends[keep]
+
+    def _read(self, indices: Iterable[int]) -> Iterator[Dict[str, Any]]:
+        """Parse the given lines, opening the file once for all of them."""
+        with open(self.path, "rb") as f:
+            for i in indices:
+                yield self._parse_line(f, i)
+
+    def _parse_line(self, f: BinaryIO, index: int) -> Dict[str, Any]:
+        f.seek(self._starts[index])
+        return orjson.loads(f.read(self._ends[index] - self._starts[index]))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._read(range(len(self)))
+
+    @overload
+    def __getitem__(self, index: int) -> Dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Dict[str, Any]]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(index, slice):
+            return list(self._read(range(*index.indices(len(self)))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        with open(self.path, "rb") as f:
+            return self._parse_line(f, index)
@@ -1,29 +1,46 @@
 """Main processor to route files to appropriate parsers and create thumbnails."""
 
 from __future__ import annotations
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
+import re
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-import json
+from typing import Any, Coroutine, List, Dict, Optional, Tuple, TypeVar
 
 import openai
+import orjson
 from PIL import Image
 
+from . import ai_cache
 from .parsers import text_parser, image_parser, doc_parser
 
 logger = logging.getLogger(__name__)
 
 THUMBNAIL_SIZE = (128, 128)
+IMAGE_WORKERS = 8  # Vision calls are I/O bound, so run them concurrently
+AI_META_MODEL = os.environ.get("AI_META_MODEL", "gpt-4.1-mini")
+MAX_AI_CHARS = 12_000  # Head and tail of long documents are enough for a summary
+SHORT_TEXT_THRESHOLD = 500  # Shorter contents get local metadata instead of an LLM call
+AI_META_BATCH_SIZE = 10  # Contents per batched metadata request
 
-def generate_ai_metadata(content: str, client: openai.Client) -> dict:
-    """Generate metadata using OpenAI API."""
-    prompt = f"""あなたは、企業のナレッジマネジメントを支援するAIアシスタントです。
-以下のテキスト（または画像の内容説明）を分析し、検索精度を最大化するためのメタデータを生成してください。
+T = TypeVar("T")
 
-このメタデータは、社内の様々な部署の従業員が、多様なキーワードで情報を探すために利用されます。
-専門用語だけでなく、日常的な言葉や、関連する可能性のある言葉も幅広く含めてください。
+# Event loop thread shared by all async OpenAI calls, started on first use
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
 
-# 指示:
+# English words, katakana words and kanji compounds make reasonable tags for short notes
+_TAG_TOKEN_REGEX = re.compile(r"[A-Za-z][A-Za-z0-9_\-]{2,}|[\u30a0-\u30ff]{2,}|[\u4e00-\u9faf]{2,}")
+_TAG_STOPWORDS = frozenset({
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "have",
+    "has", "not", "but", "you", "your", "our", "can", "will", "into", "about",
+})
+
+_METADATA_INSTRUCTIONS = """# 指示:
 1.  **要約 (summary):** テキスト全体の内容を、100文字程度で簡潔に要約してください。
 2.  **検索タグ (tags):** この内容を検索する際に使われそうなキーワードやフレーズを、JSONのリスト形式で、少なくとも10個以上、できるだけ多く挙げてください。以下の視点を必ず含めてください。
     *   中心となるトピックや概念
@@ -31,7 +48,15 @@ def generate_ai_metadata(content: str, client: openai.Client) -> dict:
     *   登場する人物名、部署名
     *   類義語や言い換え（例：会議、ミーティング、打ち合わせ）
     *   より広い概念（例：「RAG」に対して「AI」「自然言語処理」）
-    *   具体的なアクションや目的（例：「手順書」「トラブルシューティング」「企画書」）
+    *   具体的なアクションや目的（例：「手順書」「トラブルシューティング」「企画書」）"""
+
+_PROMPT = """あなたは、企業のナレッジマネジメントを支援するAIアシスタントです。
+以下のテキスト（または画像の内容説明）を分析し、検索精度を最大化するためのメタデータを生成してください。
+
+このメタデータは、社内の様々な部署の従業員が、多様なキーワードで情報を探すために利用されます。
+専門用語だけでなく、日常的な言葉や、関連する可能性のある言葉も幅広く含めてください。
+
+""" + _METADATA_INSTRUCTIONS + """
 
 # 出力形式:
 必ず以下のJSON形式で出力してください。
@@ -43,15 +68,58 @@ def generate_ai_metadata(content: str, client: openai.Client) -> dict:
 # 分析対象のテキスト/内容:
 {content}
 """
+
+_BATCH_PROMPT = """あなたは、企業のナレッジマネジメントを支援するAIアシスタントです。
+以下の{count}件のテキスト（または画像の内容説明）をそれぞれ個別に分析し、検索精度を最大化するためのメタデータを生成してください。
+
+このメタデータは、社内の様々な部署の従業員が、多様なキーワードで情報を探すために利用されます。
+専門用語だけでなく、日常的な言葉や、関連する可能性のある言葉も幅広く含めてください。
+
+""" + _METADATA_INSTRUCTIONS + """
+
+# 出力形式:
+必ず以下のJSON形式で出力してください。"items" には入力と同じ順番で、入力1件につき1つのオブジェクトを{count}件含めてください。
+{{
+  "items": [
+    {{"summary": "（入力1の要約）", "tags": ["（タグ1）", "（タグ2）", ...]}},
+    ...
+  ]
+}}
+
+# 分析対象のテキスト/内容:
+{content}
+"""
+
+def _quick_tags(content: str, limit: int = 10) -> List[str]:
+    """Pick the most frequent words of a short text as tags."""
+    counts = Counter(w for w in _TAG_TOKEN_REGEX.findall(content) if w.lower() not in _TAG_STOPWORDS)
+    return [word for word, _ in counts.most_common(limit)]
+
+def _quick_metadata(content: str) -> dict:
+    """Metadata for short contents, where an LLM call costs more than it adds."""
+    return {"ai_summary": content[:200], "ai_tags": _quick_tags(content)}
+
+def generate_ai_metadata(content: str, client: openai.Client) -> dict:
+    """Generate metadata using OpenAI API, reusing cached results for identical content."""
+    if len(content) < SHORT_TEXT_THRESHOLD:
+        return _quick_metadata(content)
+    return ai_cache.get_or_compute(
+        ai_cache.content_key("meta", content),
+        lambda: _request_ai_metadata(content, client),
+    )
+
+def _request_ai_metadata(content: str, client: openai.Client) -> dict:
+    """Call the OpenAI API to generate metadata for a single content."""
+    prompt = _PROMPT.format(content=content)
     try:
         response = client.chat.completions.create(
-            model="gpt-4.1",
+            model=AI_META_MODEL,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             response_format={"type": "json_object"},
         )
         if response.choices:
-            ai_meta = json.loads(response.choices[0].message.content)
+            ai_meta = orjson.loads(response.choices[0].message.content)
             return {
                 "ai_summary": ai_meta.get("summary", ""),
                 "ai_tags": ai_meta.get("tags", [])
@@ -59,20 +127,141 @@ def generate_ai_metadata(content: str, client: openai.Client) -> dict:
         else:
             logger.warning("AI metadata generation returned no choices.")
             return {}
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to decode JSON from AI response: {e}")
         return {}
     except Exception as e:
         logger.error(f"Failed to generate AI metadata: {e}", exc_info=True)
         return {}
 
+def generate_ai_metadata_batch(contents: List[str], client: openai.Client) -> List[dict]:
+    """Generate metadata for several contents with batched OpenAI API calls.
+
+    The result list has the same length and order as ``contents``; entries
+    that are empty or could not be generated are returned as ``{}``.
+    """
+    results: List[dict] = [{} for _ in contents]
+    keys: Dict[int, str] = {}
+    targets: List[int] = []
+    for i, content in enumerate(contents):
+        if not content:
+            continue
+        if len(content) < SHORT_TEXT_THRESHOLD:
+            results[i] = _quick_metadata(content)
+            continue
+        keys[i] = ai_cache.content_key("meta", content)
+        cached = ai_cache.get(keys[i])
+        if cached is not None:
+            results[i] = cached
+        else:
+            targets.append(i)
+
+    for start in range(0, len(targets), AI_META_BATCH_SIZE):
+        group = targets[start:start + AI_META_BATCH_SIZE]
+        items = _request_ai_metadata_batch([contents[i] for i in group], client) if len(group) > 1 else None
+        if items is None:
+            # Single input or unusable batch response: one request per content
+            for i in group:
+                results[i] = generate_ai_metadata(contents[i], client)
+            continue
+        for i, item in zip(group, items):
+            results[i] = item
+            ai_cache.put(keys[i], item)
+    return results
+
+def _request_ai_metadata_batch(texts: List[str], client: openai.Client) -> Optional[List[dict]]:
+    """Request metadata for ``texts`` in one call; None unless every input got an item."""
+    numbered = "\n\n".join(
+        f"## 入力 {n}:\n{text}" for n, text in enumerate(texts, start=1)
+    )
+    prompt = _BATCH_PROMPT.format(count=len(texts), content=numbered)
+    try:
+        response = client.chat.completions.create(
+            model=AI_META_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            response_format={"type": "json_object"},
+        )
+        if not response.choices:
+            logger.warning("Batch AI metadata generation returned no choices.")
+            return None
+        items = orjson.loads(response.choices[0].message.content).get("items", [])
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Failed to decode JSON from batch AI response: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Failed to generate batch AI metadata: {e}", exc_info=True)
+        return None
+
+    # Items are matched to inputs by position, so a missing one would shift the rest
+    if len(items) != len(texts) or not all(isinstance(item, dict) for item in items):
+        logger.warning(f"Batch AI metadata returned {len(items)} items for {len(texts)} inputs; retrying one by one.")
+        return None
+    return [
+        {"ai_summary": item.get("summary", ""), "ai_tags": item.get("tags", [])}
+        for item in items
+    ]
+
+def _truncate_for_ai(text: str) -> str:
+    """Keep the first two thirds and last third of MAX_AI_CHARS for summarisation."""
+    if len(text) <= MAX_AI_CHARS:
+        return text
+    head = text[:MAX_AI_CHARS * 2 // 3]
+    tail = text[-(MAX_AI_CHARS // 3):]
+    return head + "\n...[truncated]...\n" + tail
+
+def _describe_images(
+    images: List[Dict], client: openai.Client, aclient: Optional[openai.AsyncOpenAI] = None
+) -> List[str]:
+    """Describe embedded images concurrently, preserving their order.
+
+    Without an async client the sync client is called from a thread pool.
+    """
+    if not images:
+        return []
+
+    keys = [ai_cache.content_key("vision", img_data["image_bytes"]) for img_data in images]
+    descs = [ai_cache.get(key) for key in keys]
+    missing = [i for i, desc in enumerate(descs) if desc is None]
+    if missing:
+        missing_bytes = [images[i]["image_bytes"] for i in missing]
+        if aclient is not None:
+            fresh = _run_async(
+                image_parser.parse_images_batch(missing_bytes, aclient, max_concurrency=IMAGE_WORKERS)
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=min(IMAGE_WORKERS, len(missing_bytes))) as executor:
+                fresh = list(executor.map(lambda img_bytes: image_parser.parse_image(img_bytes, client), missing_bytes))
+        for i, desc in zip(missing, fresh):
+            descs[i] = desc
+            # Empty results (failed API calls) are not cached so they are retried later
+            if desc:
+                ai_cache.put(keys[i], desc)
+    return descs
+
+def _run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """Run ``coro`` on the shared event loop thread and wait for its result.
+
+    An AsyncOpenAI client keeps its connection pool on the loop that first
+    used it, so all calls go through one long-lived loop.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="openai-async", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
 def create_thumbnail(image_path: Path, temp_dir: Path) -> Optional[Path]:
     """Create a thumbnail for an image file."""
     try:
         with Image.open(image_path) as img:
-            img.thumbnail(THUMBNAIL_SIZE)
-            thumbnail_path = temp_dir / f"thumbnail_{image_path.stem}.png"
-            img.save(thumbnail_path, "PNG")
+            # Let the JPEG decoder skip detail that the thumbnail would discard
+            img.draft("RGB", THUMBNAIL_SIZE)
+            # Bilinear is indistinguishable from bicubic at 128px and much cheaper
+            img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.BILINEAR)
+            thumbnail_path = temp_dir / f"thumbnail_{image_path.stem}.webp"
+            img.save(thumbnail_path, "WEBP", quality=80, method=4)
             return thumbnail_path
     except Exception as e:
         logger.error(f"Failed to create thumbnail for {image_path}: {e}")
@@ -82,7 +271,8 @@ def process_file(
     file_path: str,
     metadata: dict,
     client: openai.Client,
-    temp_dir: Path
+    temp_dir: Path,
+    aclient: Optional[openai.AsyncOpenAI] = None,
 ) -> Tuple[List[Dict], Optional[Path]]:
     """Process a file, return chunks and an optional thumbnail path."""
     path = Path(file_path)
@@ -97,19 +287,26 @@ def process_file(
         # --- AI Metadata Generation ---
         full_text_for_ai = ""
         ai_meta = {}
+        texts: List[str] = []
+        images: List[Dict] = []
 
         if ext in (".txt", ".md"):
             full_text_for_ai = path.read_text(encoding="utf-8")
         elif ext in (".pdf", ".docx"):
-            texts, _ = doc_parser.parse_document(file_path)
+            # Parse once; the same pages feed both the summary and the chunks
+            texts, images = doc_parser.parse_document(file_path)
             full_text_for_ai = "\n".join(texts)
         elif ext in (".png", ".jpg", ".jpeg", ".gif", ".bmp"):
             with open(path, "rb") as f:
                 image_bytes = f.read()
-            full_text_for_ai = image_parser.parse_image(image_bytes, client)
+            full_text_for_ai = ai_cache.get_or_compute(
+                ai_cache.content_key("vision", image_bytes),
+                lambda: image_parser.parse_image(image_bytes, client),
+            )
 
-        if full_text_for_ai:
-            ai_meta = generate_ai_metadata(full_text_for_ai, client)
+        # PDF/DOCX are summarised together with their images in one batch call below
+        if full_text_for_ai and ext not in (".pdf", ".docx"):
+            ai_meta = generate_ai_metadata(_truncate_for_ai(full_text_for_ai), client)
 
         # --- Chunking and Processing ---
         if ext in (".txt", ".md"):
@@ -121,22 +318,24 @@ def process_file(
                 results.append({"text": chunk_text, "metadata": meta})
 
         elif ext in (".pdf", ".docx"):
-            texts, images = doc_parser.parse_document(file_path)
+            images = [img_data for img_data in images if img_data.get("image_bytes")]
+            descs = _describe_images(images, client, aclient)
+
+            # One metadata call for the whole document and all of its images
+            batch_meta = generate_ai_metadata_batch([_truncate_for_ai(full_text_for_ai)] + descs, client)
+            ai_meta = batch_meta[0]
+
             for i, chunk_text in enumerate(texts):
                 meta = base_meta.copy()
                 meta.update({"page": i + 1, "type": "text"})
                 meta.update(ai_meta)  # Add AI metadata
                 results.append({"text": chunk_text, "metadata": meta})
 
-            for img_data in images:
-                img_bytes = img_data.get("image_bytes", b"")
-                if img_bytes:
-                    desc = image_parser.parse_image(img_bytes, client)
-                    img_ai_meta = generate_ai_metadata(desc, client)
-                    meta = base_meta.copy()
-                    meta.update({"page": img_data.get("page_number", 0), "type": "document_image"})
-                    meta.update(img_ai_meta)
-                    results.append({"text": desc, "metadata": meta})
+            for img_data, desc, img_ai_meta in zip(images, descs, batch_meta[1:]):
+                meta = base_meta.copy()
+                meta.update({"page": img_data.get("page_number", 0), "type": "document_image"})
+                meta.update(img_ai_meta)
+                results.append({"text": desc, "metadata": meta})
 
         elif ext in (".png", ".jpg", ".jpeg", ".gif", ".bmp"):
             thumbnail_path = create_thumbnail(path, temp_dir)
@@ -1,8 +1,8 @@
 """Parser utilities."""
 
 from .text_parser import parse_text
-from .image_parser import parse_image
+from .image_parser import parse_image, parse_image_async, parse_images_batch
 from .doc_parser import parse_document
 
-__all__ = ["parse_text", "parse_image", "parse_document"]
+__all__ = ["parse_text", "parse_image", "parse_image_async", "parse_images_batch", "parse_document"]
 
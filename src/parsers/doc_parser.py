@@ -3,14 +3,48 @@
 from __future__ import annotations
 
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Dict
 
 import fitz  # PyMuPDF
 from docx import Document
 
+from ..pdf_text import extract_page_range, page_texts
+
 
 logger = logging.getLogger(__name__)
 
+# PDFs with at least this many pages have their text extracted in parallel.
+# get_text takes ~2 ms per page, so smaller files finish before workers start.
+PARALLEL_PAGE_THRESHOLD = 1000
+PAGES_PER_WORKER = 500
+
+
+def _extract_pdf_texts(file_path: str, doc: fitz.Document) -> List[str]:
+    """Extract page texts, splitting very large PDFs across worker processes.
+
+    PyMuPDF documents must not be shared between threads, so each worker
+    process opens its own handle and extracts a contiguous page range.
+    Workers are spawned rather than forked because the app process runs
+    Streamlit and ingest threads.
+    """
+    page_count = len(doc)
+    workers = min(os.cpu_count() or 1, page_count // PAGES_PER_WORKER)
+    if page_count < PARALLEL_PAGE_THRESHOLD or workers <= 1:
+        return page_texts(doc, 0, page_count)
+
+    step = -(-page_count // workers)
+    bounds = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+            futures = [ex.submit(extract_page_range, file_path, start, end) for start, end in bounds]
+            return [text for future in futures for text in future.result()]
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.warning("Parallel text extraction failed for %s, falling back: %s", file_path, exc)
+        return page_texts(doc, 0, page_count)
+
 
 def parse_document(file_path: str) -> Tuple[List[str], List[Dict]]:
     """Extract text blocks and images from a PDF or DOCX file."""
@@ -21,21 +55,25 @@ def parse_document(file_path: str) -> Tuple[List[str], List[Dict]]:
     try:
         if file_path.lower().endswith(".pdf"):
             doc = fitz.open(file_path)
+            texts = _extract_pdf_texts(file_path, doc)
+            seen_xrefs = set()  # images shared across pages are extracted only once
             for page_index in range(len(doc)):
                 page = doc[page_index]
-                texts.append(page.get_text())
-                for img in page.get_images(full=True):
-                    base = doc.extract_image(img[0])
+                for img in page.get_images(full=False):
+                    xref = img[0]
+                    if xref in seen_xrefs:
+                        continue
+                    seen_xrefs.add(xref)
+                    base = doc.extract_image(xref)
                     images.append({"image_bytes": base["image"], "page_number": page_index + 1})
         elif file_path.lower().endswith(".docx"):
             docx = Document(file_path)
             for para in docx.paragraphs:
                 if para.text:
                     texts.append(para.text)
-            for rel in docx.part._rels.values():
-                if "image" in rel.reltype:
-                    image_bytes = rel.target_part.blob
-                    images.append({"image_bytes": image_bytes, "page_number": 0})
+            # Only images referenced from the document, not the docProps thumbnail
+            for part in docx.part.package.image_parts:
+                images.append({"image_bytes": part.blob, "page_number": 0})
         else:
             logger.error("Unsupported document type: %s", file_path)
     except Exception as exc:  # pylint: disable=broad-except
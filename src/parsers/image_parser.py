@@ -2,14 +2,37 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import logging
+from typing import Any, Dict, List, Sequence
 
 import openai
 
 logger = logging.getLogger(__name__)
 
 
+_SYSTEM_PROMPT = "あなたは、画像の内容を的確に分析し、日本語で詳細に説明する専門家です。画像に写っているオブジェクト、人物、背景、テキスト、そしてそれらの関係性や状況を、具体的に記述してください。"
+
+
+def _build_messages(image_bytes: bytes, surrounding_text: str) -> List[Dict[str, Any]]:
+    # ASCII decode of the base64 output skips UTF-8 validation of the whole payload
+    b64 = base64.b64encode(image_bytes).decode("ascii")
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": f"この画像の内容を、ナレッジとして後から検索しやすいように、日本語で詳しく説明してください。特に、画像に含まれるテキストはすべて正確に書き出してください。周辺テキスト情報: {surrounding_text}",
+                },
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64," + b64}},
+            ],
+        },
+    ]
+
+
 def parse_image(image_bytes: bytes, client: openai.Client, surrounding_text: str = "") -> str:
     """Describe an image using GPT-4.1-mini.
 
@@ -29,25 +52,9 @@ def parse_image(image_bytes: bytes, client: openai.Client, surrounding_text: str
     """
 
     try:
-        b64 = base64.b64encode(image_bytes).decode()
         response = client.chat.completions.create(
             model="gpt-4.1-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "あなたは、画像の内容を的確に分析し、日本語で詳細に説明する専門家です。画像に写っているオブジェクト、人物、背景、テキスト、そしてそれらの関係性や状況を、具体的に記述してください。",
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"この画像の内容を、ナレッジとして後から検索しやすいように、日本語で詳しく説明してください。特に、画像に含まれるテキストはすべて正確に書き出してください。周辺テキスト情報: {surrounding_text}",
-                        },
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}},
-                    ],
-                },
-            ],
+            messages=_build_messages(image_bytes, surrounding_text),
             max_tokens=1024, # Increase max tokens to allow for more detailed descriptions
         )
         return response.choices[0].message.content.strip()
@@ -55,3 +62,35 @@ def parse_image(image_bytes: bytes, client: openai.Client, surrounding_text: str
         logger.error("OpenAI API error: %s", exc)
         return ""
 
+
+async def parse_image_async(
+    image_bytes: bytes, aclient: openai.AsyncClient, surrounding_text: str = ""
+) -> str:
+    """Asynchronous variant of :func:`parse_image`."""
+    try:
+        response = await aclient.chat.completions.create(
+            model="gpt-4.1-mini",
+            messages=_build_messages(image_bytes, surrounding_text),
+            max_tokens=1024,
+        )
+        return response.choices[0].message.content.strip()
+    except openai.APIError as exc:
+        logger.error("OpenAI API error: %s", exc)
+        return ""
+
+
+async def parse_images_batch(
+    items: Sequence[bytes], aclient: openai.AsyncClient, max_concurrency: int = 8
+) -> List[str]:
+    """Describe several images concurrently, preserving their order.
+
+    At most ``max_concurrency`` requests are in flight at once so large
+    documents stay within the API rate limits.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(image_bytes: bytes) -> str:
+        async with semaphore:
+            return await parse_image_async(image_bytes, aclient)
+
+    return list(await asyncio.gather(*(bounded(image_bytes) for image_bytes in items)))
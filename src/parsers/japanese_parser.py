@@ -1,21 +1,26 @@
-"""Advanced Japanese text parser using SudachiPy."""
+"""Advanced Japanese text parser that chunks on sentence punctuation."""
 
+import re
 from typing import List
-from sudachipy import tokenizer, dictionary
 
-class JapaneseSentenceSplitter:
-    """Splits Japanese text into sentences using SudachiPy."""
+# Split right after sentence-ending punctuation or a line break, keeping the delimiter
+_SENT_RE = re.compile(r"(?<=[。！？!?\n])")
 
-    def __init__(self):
-        self.tokenizer = dictionary.Dictionary().create()
-        self.mode = tokenizer.Tokenizer.SplitMode.C
+class JapaneseSentenceSplitter:
+    """Splits Japanese text into sentences at punctuation and line breaks."""
 
-    def split(self, text: str) -> List[str]:
-        """Split text into a list of sentences."""
+    def split(self, text: str, max_length: int = 512) -> List[str]:
+        """Split text into a list of sentences no longer than ``max_length``."""
         if not text:
             return []
-        # Sudachi normalizes text internally (e.g., full-width to half-width numbers)
-        return [s.surface for s in self.tokenizer.tokenize(text, self.mode)]
+        sentences: List[str] = []
+        for s in _SENT_RE.split(text):
+            if len(s) > max_length:
+                # Text without punctuation is cut so that chunks stay bounded
+                sentences.extend(s[i:i + max_length] for i in range(0, len(s), max_length))
+            elif s:
+                sentences.append(s)
+        return sentences
 
 def create_chunks(sentences: List[str], chunk_size: int = 512, overlap: int = 50) -> List[str]:
     """Create overlapping chunks from a list of sentences."""
@@ -23,20 +28,25 @@ def create_chunks(sentences: List[str], chunk_size: int = 512, overlap: int = 50
         return []
 
     chunks = []
-    current_chunk = ""
+    # Collect pieces and join once per chunk instead of growing a string
+    buf: List[str] = []
+    buf_len = 0
     for sentence in sentences:
         # If adding the new sentence exceeds chunk_size, finalize the current chunk
-        if len(current_chunk) + len(sentence) > chunk_size and current_chunk:
-            chunks.append(current_chunk)
+        if buf_len + len(sentence) > chunk_size and buf_len:
+            chunk = "".join(buf)
+            chunks.append(chunk)
             # Start new chunk with overlap from the previous one
-            overlap_text = current_chunk[-overlap:]
-            current_chunk = overlap_text + sentence
+            tail = chunk[-overlap:]
+            buf = [tail, sentence]
+            buf_len = len(tail) + len(sentence)
         else:
-            current_chunk += sentence
+            buf.append(sentence)
+            buf_len += len(sentence)
 
     # Add the last remaining chunk
-    if current_chunk:
-        chunks.append(current_chunk)
+    if buf_len:
+        chunks.append("".join(buf))
 
     return chunks
 
@@ -13,9 +13,21 @@ logger = logging.getLogger(__name__)
 # Regular expression to detect a significant number of Japanese characters
 # (Hiragana, Katakana, or common Kanji)
 JAPANESE_REGEX = re.compile(r"[\u3040-\u30ff\u4e00-\u9faf]{50,}")
+_JAPANESE_CHAR = re.compile(r"[\u3040-\u30ff\u4e00-\u9faf]")
+
+# Only the head of the text is inspected unless the result is ambiguous
+DETECTION_SAMPLE_SIZE = 4096
+JAPANESE_MIN_CHARS = 50
 
 def is_japanese(text: str) -> bool:
     """Check if the text contains a significant amount of Japanese."""
+    sample = text[:DETECTION_SAMPLE_SIZE]
+    count = len(_JAPANESE_CHAR.findall(sample))
+    if count >= JAPANESE_MIN_CHARS:
+        return True
+    if count == 0 or len(text) <= len(sample):
+        # No Japanese at the start (e.g. long ASCII logs) or nothing left to scan
+        return False
     return JAPANESE_REGEX.search(text) is not None
 
 def parse_text(file_path: str) -> list[str]:
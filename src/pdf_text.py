@@ -0,0 +1,22 @@
+"""PDF text extraction usable from worker processes.
+
+Kept outside ``src.parsers`` so spawned workers only import PyMuPDF, not
+the parser package with its OpenAI and LangChain dependencies.
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+import fitz  # PyMuPDF
+
+
+def page_texts(doc: fitz.Document, start: int, end: int) -> List[str]:
+    """Return the plain text of pages ``start`` to ``end - 1``."""
+    return [doc[i].get_text("text", flags=fitz.TEXTFLAGS_TEXT) for i in range(start, end)]
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Worker entry point: open a private handle and extract a page range."""
+    with fitz.open(file_path) as doc:
+        return page_texts(doc, start, end)
@@ -4,15 +4,23 @@ from __future__ import annotations
 
 from typing import List, Dict
 
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
 import openai
 import logging
 
+from .query_cache import QueryCache, filters_key
 from .vector_store import VectorStoreManager
 
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+ANSWER_WORKERS = 4  # Concurrent completion requests in answer_questions_batch
+
+_format_section = "[source: {} page: {}]\n{}".format
+
 
 class RAGEngine:
     """Connect VectorStoreManager and LLM to generate answers."""
@@ -20,22 +28,34 @@ class RAGEngine:
     def __init__(self, vector_store: VectorStoreManager, client: openai.Client) -> None:
         self.vector_store = vector_store
         self.client = client
+        self._answer_cache = QueryCache()
 
     def _format_context(self, docs: List[Dict]) -> str:
         """Format documents as context string."""
         sections = []
         for doc in docs:
             meta = doc.get("metadata", {})
-            source = meta.get("source_file", "unknown")
-            page = meta.get("page", 0)
-            text = doc.get("text", "")
-            sections.append(f"[source: {source} page: {page}]\n{text}")
+            sections.append(
+                _format_section(meta.get("source_file", "unknown"), meta.get("page", 0), doc.get("text", ""))
+            )
         return "\n\n".join(sections)
 
+    def _cache_key(self, question: str, search_filters: Dict[str, object]) -> tuple:
+        return (
+            hashlib.sha1(question.encode("utf-8")).hexdigest(),
+            filters_key(search_filters),
+            self.vector_store.version,
+        )
+
     def answer_question(self, question: str, filters: Dict[str, object] | None = None) -> Dict[str, object]:
         """Answer a question using current knowledge base."""
         search_filters = filters or {}
 
+        cache_key = self._cache_key(question, search_filters)
+        cached = self._answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         # 日付フィルタが指定されていない場合は、全てのナレッジを対象に検索する
         if not any(key.startswith("expiration_date") for key in search_filters):
             logger.debug("日付フィルタ未指定のため、全期間から検索します")
@@ -43,10 +63,41 @@ class RAGEngine:
         docs = self.vector_store.search(question, filters=search_filters)
 
         # **デバッグログを追加**
-        logger.debug("検索クエリ: %s", question)
-        logger.debug("適用フィルタ: %s", search_filters)
-        logger.debug("検索結果数: %s", len(docs))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("検索クエリ: %s", question)
+            logger.debug("適用フィルタ: %s", search_filters)
+            logger.debug("検索結果数: %s", len(docs))
 
+        return self._answer_from_docs(question, docs, cache_key)
+
+    def answer_questions_batch(
+        self, questions: List[str], filters: Dict[str, object] | None = None, max_workers: int = ANSWER_WORKERS
+    ) -> List[Dict[str, object]]:
+        """Answer several questions, searching them in one batch.
+
+        Completions for the questions are requested concurrently; results are
+        returned in the order of ``questions``.
+        """
+        search_filters = filters or {}
+        cache_keys = [self._cache_key(question, search_filters) for question in questions]
+        results: List[Dict[str, object] | None] = [self._answer_cache.get(key) for key in cache_keys]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            docs_per_question = self.vector_store.search_batch(
+                [questions[i] for i in missing], filters=search_filters
+            )
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+                answers = executor.map(
+                    lambda args: self._answer_from_docs(*args),
+                    [(questions[i], docs, cache_keys[i]) for i, docs in zip(missing, docs_per_question)],
+                )
+                for i, answer in zip(missing, answers):
+                    results[i] = answer
+        return results
+
+    def _answer_from_docs(self, question: str, docs: List[Dict], cache_key: tuple) -> Dict[str, object]:
+        """Generate the answer for ``question`` from retrieved ``docs``."""
         if not docs:
             return {"answer": "ナレッジベースに情報がありません。登録済みナレッジの有効期限を確認してください。", "sources": []}
 
@@ -65,12 +116,24 @@ class RAGEngine:
             answer = response.choices[0].message.content.strip()
         except openai.OpenAIError as e:
             logger.error("OpenAI API エラー: %s", e)
-            answer = "回答生成中にエラーが発生しました"
+            # Errors are not cached so the next attempt calls the API again
+            return {"answer": "回答生成中にエラーが発生しました", "sources": self._sources(docs)}
+
+        result = {"answer": answer, "sources": self._sources(docs)}
+        self._answer_cache.put(cache_key, result)
+        return result
 
+    @staticmethod
+    def _sources(docs: List[Dict]) -> List[Dict[str, object]]:
         # return both metadata and document id for referencing in the UI
-        sources = [
+        return [
             {"metadata": doc.get("metadata", {}), "doc_id": doc.get("doc_id")}
             for doc in docs
         ]
-        return {"answer": answer, "sources": sources}
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss/eviction counters of the answer and search caches."""
+        stats = self.vector_store.get_cache_stats()
+        stats["answer"] = self._answer_cache.stats()
+        return stats
 
@@ -1,21 +1,56 @@
 from __future__ import annotations
 
-import json
-from datetime import datetime
+import atexit
+import queue
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+import orjson
 
 LOG_FILE = Path("operation_history.log")
 
+# Records are appended by a background thread so callers never wait on disk I/O
+_queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _write_records() -> None:
+    LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(LOG_FILE, "ab", buffering=1 << 16) as f:
+        while True:
+            record = _queue.get()
+            if record is None:
+                break
+            f.write(record)
+            # Flush once the burst is drained so readers see new records promptly
+            if _queue.empty():
+                f.flush()
+
+
+def _ensure_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_records, name="operation-log", daemon=True)
+            _writer.start()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _writer is not None and _writer.is_alive():
+        _queue.put(None)
+        _writer.join(timeout=5)
+
 
 def log_operation(action: str, detail: Dict[str, Any]) -> None:
     """Append an operation record to the log file."""
     entry = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "action": action,
         "detail": detail,
     }
-    LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-
+    _ensure_writer()
+    _queue.put(orjson.dumps(entry) + b"\n")
@@ -5,8 +5,11 @@ import json
 import pickle
 import shutil
 import uuid
+import zipfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Iterator, Optional, Sequence, Tuple
 import hashlib
 import logging
 
@@ -15,11 +18,77 @@ logging.basicConfig(level=logging.INFO)
 import faiss
 import numpy as np
 import openai
+import orjson
 
+from .chunk_file import ChunkFile
+from .query_cache import QueryCache, filters_key
 from .utils import log_operation
 
 logger = logging.getLogger(__name__)
 
+EMBED_BATCH_SIZE = 100  # Texts per embeddings request
+EMBED_FALLBACK_DIM = 1536  # Dimension of text-embedding-3-small
+
+# HNSW graph parameters: neighbours per node and candidate list sizes
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# fp16 storage needs no training, unlike QT_8bit
+HNSW_QUANTIZER = faiss.ScalarQuantizer.QT_fp16
+# Filtered searches matching at most this many chunks are scored exactly,
+# since HNSW cannot reach enough of them through the graph
+EXACT_SEARCH_LIMIT = 4096
+# Rebuild the index once this fraction of its vectors belongs to deleted documents
+COMPACT_RATIO = 0.1
+# Query embeddings do not depend on the index contents, so they can live longer
+EMBEDDING_CACHE_TTL = 3600
+
+CompiledFilter = Callable[[Dict[str, Any]], bool]
+
+# Filters answered from the metadata indexes before FAISS scores any vector
+_INDEXED_FILTERS = frozenset(
+    {"expiration_date_gt", "expiration_date_start", "expiration_date_end", "author", "tag"}
+)
+
+_MISSING = object()
+_MIN_DATE = (0, 0, 0)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value: Any) -> Optional[Tuple[int, int, int]]:
+    """Parse a YYYY-MM-DD string (or date) into a comparable tuple, None if invalid."""
+    if not value:
+        return None
+    try:
+        year, month, day = str(value)[:10].split("-")
+        return int(year), int(month), int(day)
+    except ValueError:
+        return None
+
+def _date_key(date: Optional[Tuple[int, int, int]]) -> int:
+    """Encode a parsed date as YYYYMMDD so it can be compared in numpy, 0 if unset."""
+    if date is None:
+        return 0
+    year, month, day = date
+    return year * 10000 + month * 100 + day
+
+def _is_current_index(inner: faiss.Index) -> bool:
+    """Return True if ``inner`` is the HNSW layout created by ``_new_index``."""
+    if not isinstance(inner, faiss.IndexHNSWSQ) or inner.metric_type != faiss.METRIC_INNER_PRODUCT:
+        return False
+    return faiss.downcast_index(inner.storage).sq.qtype == HNSW_QUANTIZER
+
+def _fallback_vector(text: str, dim: int = EMBED_FALLBACK_DIM) -> np.ndarray:
+    """Deterministic pseudo-random vector from the text hash, used when embedding fails."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    rng = np.random.default_rng(int.from_bytes(digest[:8], "big"))
+    return rng.random(dim, dtype="float32")
+
+def _split_mapping(mapping: str) -> Tuple[str, int]:
+    """Parse the legacy "doc_id/chunk_index" id map format."""
+    doc_id, chunk_index = mapping.split("/")
+    return doc_id, int(chunk_index)
+
 class VectorStoreManager:
     """Manages a vector store where each document has its own directory."""
 
@@ -33,119 +102,368 @@ class VectorStoreManager:
         self.faiss_path.mkdir(parents=True, exist_ok=True)
 
         self.index_file = self.faiss_path / "kb.faiss"
-        self.id_map_file = self.faiss_path / "id_map.pkl"
-
-        self.index: Optional[faiss.IndexIDMap] = None
-        self.id_map: Dict[int, str] = {}
-        self.documents: Dict[str, List[Dict]] = {}
+        self.id_map_file = self.faiss_path / "id_map.npz"
+        self.legacy_id_map_file = self.faiss_path / "id_map.pkl"
+
+        self.index: Optional[faiss.IndexIDMap2] = None
+        self.id_map: Dict[int, Tuple[str, int]] = {}  # FAISS ID -> (doc_id, chunk_index)
+        # Chunks are read and parsed on access, see ChunkFile
+        self.documents: Dict[str, Sequence[Dict]] = {}
+        # Metadata indexes used to restrict FAISS to matching ids before scoring;
+        # built by the first search that filters on them
+        self._filter_index_ready = False
+        self.expiration_by_faiss_id: Dict[int, int] = {}  # YYYYMMDD, 0 if unset
+        self.author_index: Dict[Any, set[int]] = {}
+        self.tag_index: Dict[str, set[int]] = {}
+        self._filter_arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # HNSW cannot remove vectors, so deleted ids stay in the index until compaction
+        self.deleted_faiss_ids: set[int] = set()
+        # Unsaved index changes; written by commit()
+        self._dirty = False
+        self._bulk_depth = 0
+        # Bumped on every add/delete so cached search results go stale
+        self._version = 0
+        self._embedding_cache = QueryCache(ttl=EMBEDDING_CACHE_TTL)
+        self._search_cache = QueryCache()
 
         self._load()
 
     def _load(self) -> None:
-        """Load the FAISS index, ID map, and all document chunks."""
-        if self.index_file.exists() and self.id_map_file.exists():
+        """Load the FAISS index, ID map, and map all document chunk files."""
+        has_id_map = self.id_map_file.exists() or self.legacy_id_map_file.exists()
+        if self.index_file.exists() and has_id_map:
             try:
                 self.index = faiss.read_index(str(self.index_file))
-                with open(self.id_map_file, "rb") as f:
-                    self.id_map = pickle.load(f)
-            except EOFError:
+                if self.id_map_file.exists():
+                    with np.load(self.id_map_file, allow_pickle=False) as data:
+                        pairs = zip(data["doc_ids"].tolist(), data["chunk_indices"].tolist())
+                        self.id_map = dict(zip(data["faiss_ids"].tolist(), pairs))
+                else:
+                    # Knowledge bases saved before the switch to .npz
+                    with open(self.legacy_id_map_file, "rb") as f:
+                        self.id_map = {
+                            faiss_id: _split_mapping(mapping) for faiss_id, mapping in pickle.load(f).items()
+                        }
+                    self._dirty = True
+            except (EOFError, OSError, ValueError, KeyError, RuntimeError, zipfile.BadZipFile):
                 # If files are empty or corrupted, start fresh
                 self.index = None
                 self.id_map = {}
                 # Optionally, you could also delete the corrupted files here
                 self.index_file.unlink(missing_ok=True)
                 self.id_map_file.unlink(missing_ok=True)
+                self.legacy_id_map_file.unlink(missing_ok=True)
+
+        if self.index is not None:
+            self.deleted_faiss_ids = set(self._index_ids().tolist()) - set(self.id_map)
+            if not _is_current_index(faiss.downcast_index(self.index.index)):
+                # Migrate IndexFlatL2, unnormalized L2 HNSW and float32 HNSW indexes
+                self._rebuild_index()
+                self._dirty = True
+            else:
+                faiss.downcast_index(self.index.index).hnsw.efSearch = HNSW_EF_SEARCH
 
         for doc_dir in self.docs_path.iterdir():
-            if doc_dir.is_dir():
-                doc_id = doc_dir.name
-                chunks_file = doc_dir / "chunks.jsonl"
-                if chunks_file.exists():
-                    with open(chunks_file, "r", encoding="utf-8") as f:
-                        self.documents[doc_id] = [json.loads(line) for line in f]
+            chunks_file = doc_dir / "chunks.jsonl"
+            if doc_dir.is_dir() and chunks_file.exists():
+                self.documents[doc_dir.name] = ChunkFile(chunks_file)
+
+        # Persist migrations of older index or id map formats
+        self.commit()
+
+    @property
+    def version(self) -> int:
+        """Counter bumped on every add/delete, for keying caches of search-derived results."""
+        return self._version
+
+    def _chunk(self, faiss_id: int) -> Optional[Dict]:
+        """Return the chunk stored under a FAISS ID, or None if it was deleted."""
+        mapping = self.id_map.get(faiss_id)
+        if mapping is None:
+            return None
+        doc_id, chunk_index = mapping
+        doc_chunks = self.documents.get(doc_id)
+        if not doc_chunks or chunk_index >= len(doc_chunks):
+            return None
+        return doc_chunks[chunk_index]
+
+    def _build_filter_index(self) -> None:
+        """Index chunk metadata on first use so startup does not parse every chunk."""
+        for faiss_id in self.id_map:
+            chunk = self._chunk(faiss_id)
+            if chunk is not None:
+                self._register_chunk(faiss_id, chunk)
+        self._filter_index_ready = True
+
+    def _register_chunk(self, faiss_id: int, chunk: Dict) -> None:
+        meta = chunk.get("metadata", {})
+        self.expiration_by_faiss_id[faiss_id] = _date_key(_parse_date(meta.get("expiration_date")))
+        self.author_index.setdefault(meta.get("author"), set()).add(faiss_id)
+        for tag in meta.get("ai_tags") or ():
+            self.tag_index.setdefault(tag, set()).add(faiss_id)
+        self._filter_arrays = None
+
+    def _unregister_chunk(self, faiss_id: int, chunk: Optional[Dict]) -> None:
+        self.expiration_by_faiss_id.pop(faiss_id, None)
+        if chunk is not None:
+            meta = chunk.get("metadata", {})
+            self.author_index.get(meta.get("author"), set()).discard(faiss_id)
+            for tag in meta.get("ai_tags") or ():
+                self.tag_index.get(tag, set()).discard(faiss_id)
+        self._filter_arrays = None
+
+    def _select_ids(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Return the live FAISS ids passing the indexed filters, or None if none are set."""
+        filters = filters or {}
+        if not any(key in _INDEXED_FILTERS for key in filters):
+            return None
+
+        if not self._filter_index_ready:
+            self._build_filter_index()
+        if self._filter_arrays is None:
+            count = len(self.expiration_by_faiss_id)
+            self._filter_arrays = (
+                np.fromiter(self.expiration_by_faiss_id.keys(), dtype="int64", count=count),
+                np.fromiter(self.expiration_by_faiss_id.values(), dtype="int64", count=count),
+            )
+        ids, dates = self._filter_arrays
+
+        mask = np.ones(len(ids), dtype=bool)
+        if "expiration_date_gt" in filters:
+            # 有効期限が設定されていない (0) チャンクも除外される
+            mask &= dates > _date_key(_parse_date(filters["expiration_date_gt"]))
+        start = _parse_date(filters.get("expiration_date_start"))
+        if start is not None:
+            mask &= (dates == 0) | (dates >= _date_key(start))
+        end = _parse_date(filters.get("expiration_date_end"))
+        if end is not None:
+            mask &= (dates == 0) | (dates <= _date_key(end))
+
+        allowed: Optional[set[int]] = None
+        if "author" in filters:
+            allowed = self.author_index.get(filters["author"], set())
+        if "tag" in filters:
+            value = filters["tag"]
+            tagged = set().union(*(self.tag_index.get(t, ()) for t in ([value] if isinstance(value, str) else value)))
+            allowed = tagged if allowed is None else allowed & tagged
+        if allowed is not None:
+            mask &= np.isin(ids, np.fromiter(allowed, dtype="int64", count=len(allowed)))
+        return ids[mask]
 
     def _save_index(self) -> None:
         """Save the FAISS index and the ID-to-document mapping."""
         if self.index is not None:
             faiss.write_index(self.index, str(self.index_file))
-            with open(self.id_map_file, "wb") as f:
-                pickle.dump(self.id_map, f)
+            # Two parallel arrays instead of a pickle: faster to load and safe to read
+            np.savez_compressed(
+                self.id_map_file,
+                faiss_ids=np.fromiter(self.id_map.keys(), dtype="int64", count=len(self.id_map)),
+                doc_ids=np.array([doc_id for doc_id, _ in self.id_map.values()], dtype=str),
+                chunk_indices=np.array([idx for _, idx in self.id_map.values()], dtype="int64"),
+            )
+            self.legacy_id_map_file.unlink(missing_ok=True)
 
-    def _embed(self, text: str) -> np.ndarray:
+    def commit(self) -> None:
+        """Write pending index changes to disk."""
+        if self._dirty:
+            self._save_index()
+            self._dirty = False
+
+    @contextmanager
+    def bulk_insert(self) -> Iterator[None]:
+        """Defer saving the index until the block exits, e.g. when adding many documents."""
+        self._bulk_depth += 1
+        try:
+            yield
+        finally:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self.commit()
+
+    def _mark_dirty(self, autosave: bool) -> None:
+        self._dirty = True
+        if autosave and not self._bulk_depth:
+            self.commit()
+
+    def _new_index(self, dim: int) -> faiss.IndexIDMap2:
+        """Create an empty inner-product HNSW index that keeps our own FAISS ids.
+
+        Vectors are L2-normalized before insertion, so inner product is cosine similarity.
+        They are stored as float16, halving memory at negligible recall loss.
+        """
+        hnsw = faiss.IndexHNSWSQ(dim, HNSW_QUANTIZER, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+        return faiss.IndexIDMap2(hnsw)
+
+    def _index_ids(self) -> np.ndarray:
+        """Return the FAISS ids stored in the index, in insertion order."""
+        return faiss.vector_to_array(self.index.id_map)
+
+    def _rebuild_index(self) -> None:
+        """Rebuild the index from its live vectors, dropping deleted ids."""
+        ids = self._index_ids()
+        vectors = np.ascontiguousarray(self.index.index.reconstruct_n(0, self.index.ntotal), dtype="float32")
+        faiss.normalize_L2(vectors)
+        keep = np.isin(ids, np.fromiter(self.deleted_faiss_ids, dtype=ids.dtype), invert=True)
+        index = self._new_index(self.index.d)
+        if keep.any():
+            index.add_with_ids(vectors[keep], ids[keep])
+        self.index = index
+        self.deleted_faiss_ids.clear()
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed a single text, returning None if the request fails."""
         try:
             response = self.client.embeddings.create(
                 model="text-embedding-3-small", input=text
             )
-            return np.array(response.data[0].embedding, dtype="float32")
         except Exception as exc:  # pylint: disable=broad-except
             logger.error("Embedding failed: %s", exc)
-            # Fallback: deterministic pseudo-random vector from text hash
-            digest = hashlib.sha256(text.encode("utf-8")).digest()
-            rng = np.random.default_rng(int.from_bytes(digest[:8], "big"))
-            return rng.random(1536, dtype="float32")
+            return None
+        vector = np.array(response.data[0].embedding, dtype="float32")
+        vector /= np.linalg.norm(vector) + 1e-12
+        return vector
+
+    def _embed_batch(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Embed texts with as few API calls as possible, preserving input order.
+
+        Returns the normalized vectors and a boolean mask of the rows that got a
+        fallback vector because they were blank or their request failed.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype="float32"), np.empty(0, dtype=bool)
+        # The API rejects empty input, so blank chunks (e.g. scanned PDF pages)
+        # never go into a request and get the fallback vector instead
+        rows = [i for i, text in enumerate(texts) if text.strip()]
+        embedded: Dict[int, Sequence[float]] = {}
+        for start in range(0, len(rows), EMBED_BATCH_SIZE):
+            group = rows[start:start + EMBED_BATCH_SIZE]
+            for i, vector in zip(group, self._embed_group([texts[i] for i in group])):
+                if vector is not None:
+                    embedded[i] = vector
+
+        if embedded:
+            dim = len(next(iter(embedded.values())))
+        else:
+            dim = self.index.d if self.index is not None else EMBED_FALLBACK_DIM
+        # Allocate the result once and write each embedding into its row
+        matrix = np.empty((len(texts), dim), dtype="float32")
+        fallback = np.zeros(len(texts), dtype=bool)
+        for i, text in enumerate(texts):
+            vector = embedded.get(i)
+            if vector is None:
+                vector = _fallback_vector(text, dim)
+                fallback[i] = True
+            matrix[i] = vector
+        faiss.normalize_L2(matrix)
+        return matrix, fallback
+
+    def _embed_group(self, texts: List[str]) -> List[Optional[Sequence[float]]]:
+        """Embed one request worth of texts, splitting the group if an input is rejected.
+
+        Texts that could not be embedded are returned as None.
+        """
+        if len(texts) == 1:
+            return [self._embed(texts[0])]
+        try:
+            response = self.client.embeddings.create(
+                model="text-embedding-3-small", input=texts
+            )
+            # The API returns embeddings in input order
+            return [d.embedding for d in response.data]
+        except openai.BadRequestError as exc:
+            # One invalid input fails the whole request; bisect to isolate it
+            logger.warning("Batch embedding of %d texts was rejected, splitting: %s", len(texts), exc)
+            mid = len(texts) // 2
+            return self._embed_group(texts[:mid]) + self._embed_group(texts[mid:])
+        except Exception as exc:  # pylint: disable=broad-except
+            # Connection, auth or rate limit errors would fail for every half too
+            logger.error("Batch embedding of %d texts failed: %s", len(texts), exc)
+            return [None] * len(texts)
 
-    def _match_filters(self, chunk: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
-        """Return True if the chunk satisfies the filter conditions."""
-        if not filters:
-            return True
+    def _compile_filters(self, filters: Optional[Dict[str, Any]]) -> CompiledFilter:
+        """Turn filter conditions into a predicate evaluated once per candidate chunk.
 
-        meta = chunk.get("metadata", {})
-        text = chunk.get("text", "")
+        Values are normalised here so that the per-chunk check only does cheap
+        lookups and tuple comparisons.
+        """
+        if not filters:
+            return lambda chunk: True
 
-        # **デバッグログを追加**
-        logger.debug("チャンクのメタデータ: %s", meta)
-        logger.debug("適用中のフィルタ: %s", filters)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("適用中のフィルタ: %s", filters)
 
+        exp_gt = exp_start = exp_end = None
+        author = _MISSING
+        tags: Optional[frozenset] = None
+        keyword: Optional[str] = None
+        others: List[Tuple[str, Any]] = []
         for key, value in filters.items():
             if key == "expiration_date_gt":
-                exp = meta.get("expiration_date")
-                logger.debug("有効期限チェック: %s > %s", exp, value)
-                if not exp:
-                    # 有効期限が設定されていない場合は除外
-                    logger.debug("有効期限未設定のため除外")
-                    return False
-                # 文字列での日付比較（YYYY-MM-DD形式を前提）
-                if exp <= value:
-                    logger.debug("期限切れのため除外: %s <= %s", exp, value)
-                    return False
+                exp_gt = _parse_date(value)
             elif key == "expiration_date_start":
-                exp = meta.get("expiration_date")
-                logger.debug("開始日チェック: %s >= %s", exp, value)
-                if exp and exp < value:
-                    return False
+                exp_start = _parse_date(value)
             elif key == "expiration_date_end":
-                exp = meta.get("expiration_date")
-                logger.debug("終了日チェック: %s <= %s", exp, value)
-                if exp and exp > value:
-                    return False
+                exp_end = _parse_date(value)
             elif key == "author":
-                if meta.get("author") != value:
-                    logger.debug("作成者不一致: %s != %s", meta.get('author'), value)
-                    return False
+                author = value
             elif key == "tag":
-                tags = meta.get("ai_tags", [])
-                if isinstance(value, str):
-                    if value not in tags:
-                        logger.debug("タグ不一致: %s not in %s", value, tags)
-                        return False
-                else:
-                    if not any(v in tags for v in value):
-                        logger.debug("タグ不一致: %s not in %s", value, tags)
-                        return False
+                tags = frozenset([value] if isinstance(value, str) else value)
             elif key == "keyword":
-                if value.lower() not in text.lower():
-                    logger.debug("キーワード不一致: %s not in text", value)
-                    return False
+                keyword = value.lower()
             else:
+                others.append((key, value))
+        # An unparsable bound compares like a missing expiration date
+        if "expiration_date_gt" in filters and exp_gt is None:
+            exp_gt = _MIN_DATE
+
+        def match(chunk: Dict[str, Any]) -> bool:
+            meta = chunk.get("metadata", {})
+            if exp_gt is not None or exp_start is not None or exp_end is not None:
+                exp = _parse_date(meta.get("expiration_date"))
+                # 有効期限が設定されていない場合は exp_gt でのみ除外
+                if exp_gt is not None and (exp is None or exp <= exp_gt):
+                    if debug:
+                        logger.debug("期限切れまたは未設定のため除外: %s", meta.get("expiration_date"))
+                    return False
+                if exp is not None:
+                    if exp_start is not None and exp < exp_start:
+                        return False
+                    if exp_end is not None and exp > exp_end:
+                        return False
+            if author is not _MISSING and meta.get("author") != author:
+                if debug:
+                    logger.debug("作成者不一致: %s != %s", meta.get("author"), author)
+                return False
+            if tags is not None and tags.isdisjoint(meta.get("ai_tags", ())):
+                if debug:
+                    logger.debug("タグ不一致: %s not in %s", tags, meta.get("ai_tags"))
+                return False
+            if keyword is not None and keyword not in chunk.get("text", "").lower():
+                return False
+            for key, value in others:
                 if meta.get(key) != value:
-                    logger.debug("メタデータ不一致: %s != %s", meta.get(key), value)
+                    if debug:
+                        logger.debug("メタデータ不一致: %s != %s", meta.get(key), value)
                     return False
+            return True
 
-        logger.debug("フィルタ条件をすべて満たしています")
-        return True
+        return match
+
+    def add_document(
+        self,
+        original_path: Path,
+        chunks: List[Dict],
+        thumbnail_path: Optional[Path],
+        autosave: bool = True,
+    ) -> None:
+        """Add a new document and its chunks to the knowledge base.
 
-    def add_document(self, original_path: Path, chunks: List[Dict], thumbnail_path: Optional[Path]) -> None:
-        """Add a new document and its chunks to the knowledge base."""
+        With ``autosave=False`` (or inside ``bulk_insert``) the index is only
+        written on ``commit()``.
+        """
         doc_id = str(uuid.uuid4())
         doc_dir = self.docs_path / doc_id
         doc_dir.mkdir()
@@ -156,30 +474,32 @@ class VectorStoreManager:
             shutil.copy(thumbnail_path, doc_dir / thumbnail_path.name)
 
         # Store chunks in a human-readable JSONL file
-        with open(doc_dir / "chunks.jsonl", "w", encoding="utf-8") as f:
-            for chunk in chunks:
-                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        with open(doc_dir / "chunks.jsonl", "wb") as f:
+            f.write(b"".join(orjson.dumps(chunk) + b"\n" for chunk in chunks))
 
         # Add vectors to FAISS index
-        vectors = [self._embed(chunk['text']) for chunk in chunks]
-        if not vectors:
+        if not chunks:
             return
+        vectors, _ = self._embed_batch([chunk['text'] for chunk in chunks])
 
-        vector_dim = vectors[0].shape[0]
+        vector_dim = vectors.shape[1]
         if self.index is None:
-            index = faiss.IndexFlatL2(vector_dim)
-            self.index = faiss.IndexIDMap(index)
+            self.index = self._new_index(vector_dim)
 
-        # Generate unique, sequential IDs for FAISS
-        start_id = max(self.id_map.keys()) + 1 if self.id_map else 0
-        ids = np.arange(start_id, start_id + len(vectors))
+        # Generate unique, sequential IDs for FAISS (deleted ids may still be in the index)
+        start_id = int(self._index_ids().max()) + 1 if self.index.ntotal else 0
+        ids = np.arange(start_id, start_id + len(vectors), dtype="int64")
 
-        self.index.add_with_ids(np.array(vectors), ids)
+        self.index.add_with_ids(vectors, ids)
         for i, faiss_id in enumerate(ids):
-            self.id_map[int(faiss_id)] = f"{doc_id}/{i}"  # Map FAISS ID to doc_id and chunk_index
+            self.id_map[int(faiss_id)] = (doc_id, i)
 
-        self._save_index()
+        self._mark_dirty(autosave)
+        self._version += 1
         self.documents[doc_id] = chunks
+        if self._filter_index_ready:
+            for faiss_id, chunk in zip(ids.tolist(), chunks):
+                self._register_chunk(faiss_id, chunk)
         log_operation("add_document", {"doc_id": doc_id, "file": str(original_path)})
 
     def delete_document(self, doc_id: str) -> bool:
@@ -189,57 +509,145 @@ class VectorStoreManager:
             return False
 
         # Find FAISS IDs to remove
-        ids_to_remove = [faiss_id for faiss_id, mapping in self.id_map.items() if mapping.startswith(doc_id)]
+        ids_to_remove = [faiss_id for faiss_id, (mapped_doc, _) in self.id_map.items() if mapped_doc == doc_id]
         if ids_to_remove and self.index is not None:
-            self.index.remove_ids(np.array(ids_to_remove))
             for faiss_id in ids_to_remove:
+                if self._filter_index_ready:
+                    self._unregister_chunk(faiss_id, self._chunk(faiss_id))
                 del self.id_map[faiss_id]
-            self._save_index()
+            # Unmapped ids are skipped by search; compact once enough have piled up
+            self.deleted_faiss_ids.update(ids_to_remove)
+            if len(self.deleted_faiss_ids) > COMPACT_RATIO * self.index.ntotal:
+                self._rebuild_index()
+            self._mark_dirty(autosave=True)
 
         # Delete document directory
+        self.documents.pop(doc_id, None)
         shutil.rmtree(doc_dir)
-        if doc_id in self.documents:
-            del self.documents[doc_id]
+        self._version += 1
 
         log_operation("delete_document", {"doc_id": doc_id})
 
         return True
 
     def search(self, query: str, k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        if self.index is None or not self.documents:
-            return []
-
-        query_vector = self._embed(query)
-        distances, ids = self.index.search(np.expand_dims(query_vector, axis=0), k * 5) # Search more to filter
-
-        results = []
-        seen_mappings = set()
-        for dist, faiss_id in zip(distances[0], ids[0]):
-            if faiss_id == -1 or len(results) >= k:
-                continue
-
-            mapping = self.id_map.get(int(faiss_id))
-            if not mapping or mapping in seen_mappings:
-                continue
-
-            doc_id, chunk_index_str = mapping.split("/")
-            chunk_index = int(chunk_index_str)
+        return self.search_batch([query], k=k, filters=filters)[0]
 
-            doc_chunks = self.documents.get(doc_id)
-            if not doc_chunks or chunk_index >= len(doc_chunks):
-                continue
+    def search_batch(
+        self, queries: List[str], k: int = 5, filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search several queries with one embeddings request and one FAISS call.
 
-            chunk = doc_chunks[chunk_index]
-            if not self._match_filters(chunk, filters):
-                continue
+        Returns one result list per query, in the order of ``queries``.
+        """
+        if self.index is None or not self.documents:
+            return [[] for _ in queries]
 
-            chunk_with_score = chunk.copy()
-            chunk_with_score["score"] = float(dist)
-            chunk_with_score["doc_id"] = doc_id # Add doc_id for deletion UI
-            results.append(chunk_with_score)
-            seen_mappings.add(mapping)
+        hashes = [hashlib.sha1(query.encode("utf-8")).hexdigest() for query in queries]
+        cache_keys = [(query_hash, filters_key(filters), k, self._version) for query_hash in hashes]
+        results: List[Optional[List[Dict[str, Any]]]] = [self._search_cache.get(key) for key in cache_keys]
 
-        return results
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if missing:
+            query_matrix, fallback = self._query_vectors(
+                [queries[i] for i in missing], [hashes[i] for i in missing]
+            )
+            for i, hits, is_fallback in zip(missing, self._search_vectors(query_matrix, k, filters), fallback):
+                # Results from a fallback vector are meaningless; retry the embedding next time
+                if not is_fallback:
+                    self._search_cache.put(cache_keys[i], hits)
+                results[i] = hits
+
+        return [[dict(chunk) for chunk in hits] for hits in results]
+
+    def _query_vectors(self, queries: List[str], hashes: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return normalized query embeddings, embedding only the uncached ones.
+
+        The second value marks the queries that got a fallback vector; those are
+        not cached so a later search retries the embedding.
+        """
+        vectors = [self._embedding_cache.get(query_hash) for query_hash in hashes]
+        fallback = np.zeros(len(queries), dtype=bool)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded, missing_fallback = self._embed_batch([queries[i] for i in missing])
+            for i, vector, is_fallback in zip(missing, embedded, missing_fallback):
+                if is_fallback:
+                    fallback[i] = True
+                else:
+                    self._embedding_cache.put(hashes[i], vector)
+                vectors[i] = vector
+        return np.vstack(vectors), fallback
+
+    def _exact_search(
+        self, query_matrix: np.ndarray, candidate_ids: np.ndarray, fetch_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score ``candidate_ids`` by brute force, returning FAISS-style (distances, ids)."""
+        scores = query_matrix @ self.index.reconstruct_batch(candidate_ids).T
+        top = np.argsort(-scores, axis=1)[:, :fetch_k]
+        return np.take_along_axis(scores, top, axis=1), candidate_ids[top]
+
+    def _search_vectors(
+        self, query_matrix: np.ndarray, k: int, filters: Optional[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Run one FAISS search for all query rows and post-filter each row."""
+        # Only keyword and custom metadata filters are checked after the search;
+        # those still need extra candidates to end up with k results
+        fetch_k = k * 5 if any(key not in _INDEXED_FILTERS for key in filters or {}) else k
+        selected = self._select_ids(filters)
+        if selected is None:
+            if self.deleted_faiss_ids:
+                # Skip tombstones during the graph walk; a hash lookup per visited node
+                deleted = faiss.IDSelectorBatch(
+                    np.fromiter(self.deleted_faiss_ids, dtype="int64", count=len(self.deleted_faiss_ids))
+                )
+                params = faiss.SearchParametersHNSW(sel=faiss.IDSelectorNot(deleted), efSearch=HNSW_EF_SEARCH)
+                distances, ids = self.index.search(query_matrix, fetch_k, params=params)
+            else:
+                distances, ids = self.index.search(query_matrix, fetch_k)
+        elif not len(selected):
+            return [[] for _ in range(len(query_matrix))]
+        elif len(selected) <= EXACT_SEARCH_LIMIT:
+            # A graph walk restricted to few ids misses most of them; score them all instead
+            distances, ids = self._exact_search(query_matrix, selected, fetch_k)
+        else:
+            params = faiss.SearchParametersHNSW(
+                sel=faiss.IDSelectorBatch(selected), efSearch=max(HNSW_EF_SEARCH, fetch_k)
+            )
+            distances, ids = self.index.search(query_matrix, fetch_k, params=params)
+
+        match = self._compile_filters(filters)
+        batch_results = []
+        for row_distances, row_ids in zip(distances, ids):
+            results = []
+            seen_ids = set()
+            for dist, faiss_id in zip(row_distances, row_ids):
+                if len(results) >= k:
+                    break
+
+                faiss_id = int(faiss_id)
+                # Deleted (tombstoned) ids and -1 padding have no chunk
+                chunk = self._chunk(faiss_id)
+                if chunk is None or faiss_id in seen_ids:
+                    continue
+
+                if not match(chunk):
+                    continue
+
+                chunk_with_score = chunk.copy()
+                chunk_with_score["score"] = float(dist)
+                chunk_with_score["doc_id"] = self.id_map[faiss_id][0] # Add doc_id for deletion UI
+                results.append(chunk_with_score)
+                seen_ids.add(faiss_id)
+            batch_results.append(results)
+        return batch_results
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss/eviction counters of the query caches."""
+        return {
+            "embedding": self._embedding_cache.stats(),
+            "search": self._search_cache.stats(),
+        }
 
     def export_all(self, export_path: str) -> None:
         """Export the entire knowledge base to a JSON Lines file."""